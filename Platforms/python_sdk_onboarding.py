@@ -2,13 +2,34 @@
 # Use Courier's Python SDK for backend onboarding flows
 
 from trycourier import Courier
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import asyncio
-from typing import Dict, List, Optional, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import partial
+from itertools import compress
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, ClassVar, Final, Mapping, Tuple, TypedDict, Union
 from dataclasses import dataclass
 from enum import Enum
+from types import MappingProxyType
 
-# Initialize Courier client
+try:
+    # Optional C parser, much faster than the stdlib on hot paths
+    from ciso8601 import parse_datetime as _parse_iso
+except ImportError:
+    def _parse_iso(date_str: str) -> datetime:
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+
+def _to_epoch(date_str: str) -> int:
+    """Convert an ISO-8601 timestamp to Unix seconds, reading naive values as UTC"""
+    parsed = _parse_iso(date_str)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+# Initialize Courier client once and pass this instance to
+# PythonOnboardingSystem rather than creating another one
 client = Courier(
     auth_token="YOUR_COURIER_AUTH_TOKEN"
 )
@@ -19,7 +40,64 @@ class OnboardingPlan(Enum):
     ENTERPRISE = "enterprise"
     EDUCATION = "education"
 
-@dataclass
+# Plan-specific settings, built once at import instead of on every call
+_AUTOMATIONS: Final[Dict[OnboardingPlan, str]] = {
+    OnboardingPlan.TRIAL: "trial-onboarding-flow",
+    OnboardingPlan.STARTUP: "startup-onboarding-flow",
+    OnboardingPlan.ENTERPRISE: "enterprise-onboarding-flow",
+    OnboardingPlan.EDUCATION: "education-onboarding-flow"
+}
+
+_PLAN_FEATURES: Final[Dict[OnboardingPlan, Tuple[str, ...]]] = {
+    OnboardingPlan.TRIAL: ("basic_features", "email_support"),
+    OnboardingPlan.STARTUP: ("all_features", "priority_support", "integrations"),
+    OnboardingPlan.ENTERPRISE: ("all_features", "dedicated_support", "sso", "api_access"),
+    OnboardingPlan.EDUCATION: ("education_features", "bulk_licensing", "lms_integration")
+}
+
+_SUPPORT_EMAIL: Final[Dict[OnboardingPlan, str]] = {
+    OnboardingPlan.ENTERPRISE: "enterprise-support@example.com"
+}
+
+_CHECKLIST_BASE: Final[Tuple[str, ...]] = (
+    "Complete your profile",
+    "Invite team members",
+    "Create first project",
+    "Connect integrations"
+)
+
+_CHECKLIST_ENTERPRISE_EXTRA: Final[Tuple[str, ...]] = (
+    "Schedule onboarding call",
+    "Configure SSO",
+    "Review security settings"
+)
+
+# The plan-dependent part of the welcome email, so only user fields are
+# filled in at send time
+_WELCOME_PLAN_DATA: Final[Dict[OnboardingPlan, Mapping[str, Any]]] = {
+    plan: MappingProxyType({
+        "support_email": _SUPPORT_EMAIL.get(plan, "support@example.com"),
+        "onboarding_checklist": (
+            _CHECKLIST_BASE + _CHECKLIST_ENTERPRISE_EXTRA
+            if plan is OnboardingPlan.ENTERPRISE else _CHECKLIST_BASE
+        )
+    })
+    for plan in OnboardingPlan
+}
+
+class MessageTo(TypedDict, total=False):
+    user_id: str
+    slack: Dict[str, str]
+
+class CourierMessage(TypedDict, total=False):
+    """Shape of the message passed to courier.send, checked statically"""
+    to: MessageTo
+    template: str
+    data: Dict[str, Any]
+    channels: Union[List[str], Dict[str, Dict[str, Any]]]
+    metadata: Dict[str, Any]
+
+@dataclass(slots=True, frozen=True)
 class User:
     id: str
     email: str
@@ -29,9 +107,107 @@ class User:
     company_size: int
     created_at: datetime
 
+def _score(emails_sent: int, emails_opened: int, tasks_completed: int,
+           days_since_activity: Optional[int]) -> int:
+    """Calculate engagement score (0-100) from plain counters"""
+    score = 0
+    
+    # Email engagement (max 40 points)
+    if emails_sent > 0:
+        open_rate = emails_opened / emails_sent
+        score += min(open_rate * 40, 40)
+    
+    # Task completion (max 40 points)
+    score += min(tasks_completed * 10, 40)
+    
+    # Recency (max 20 points)
+    if days_since_activity is not None:
+        if days_since_activity == 0:
+            score += 20
+        elif days_since_activity <= 3:
+            score += 10
+        elif days_since_activity <= 7:
+            score += 5
+    
+    return min(score, 100)
+
+def _is_at_risk(engagement_score: float, days_since_signup: int, tasks_completed: int,
+                emails_opened: int, emails_sent: int) -> bool:
+    """Check whether a user's onboarding needs an intervention"""
+    return (
+        engagement_score < 30 or
+        days_since_signup > 7 and tasks_completed < 2 or
+        emails_opened == 0 and emails_sent > 3
+    )
+
 class PythonOnboardingSystem:
+    PROFILE_CACHE_TTL = 60  # seconds
+    PROFILE_CACHE_SIZE = 1024
+    MAX_CONCURRENT_SENDS = 32
+    MAX_WORKERS = 32
+    ACTIVATION_SCORE = 50
+    
+    # Static message settings, shared by every call instead of rebuilt
+    _BASE_TASKS: ClassVar[Tuple[Mapping[str, Any], ...]] = (
+        MappingProxyType({
+            "id": "complete-profile",
+            "title": "Complete your profile",
+            "priority": 1,
+            "due_days": 1
+        }),
+        MappingProxyType({
+            "id": "invite-team",
+            "title": "Invite your team members",
+            "priority": 2,
+            "due_days": 3
+        }),
+        MappingProxyType({
+            "id": "create-project",
+            "title": "Create your first project",
+            "priority": 3,
+            "due_days": 7
+        })
+    )
+    
+    _ENTERPRISE_TASKS: ClassVar[Tuple[Mapping[str, Any], ...]] = (
+        MappingProxyType({
+            "id": "schedule-onboarding-call",
+            "title": "Schedule onboarding call with success team",
+            "priority": 0,
+            "due_days": 1
+        }),
+        MappingProxyType({
+            "id": "setup-sso",
+            "title": "Configure Single Sign-On",
+            "priority": 4,
+            "due_days": 14
+        })
+    )
+    
+    _CELEBRATIONS: ClassVar[Mapping[str, Mapping[str, str]]] = MappingProxyType({
+        "first_project": MappingProxyType({
+            "template": "first-project-celebration",
+            "reward": "1 month free upgrade"
+        }),
+        "team_invited": MappingProxyType({
+            "template": "team-growth-celebration",
+            "reward": "Collaboration guide"
+        }),
+        "week_active": MappingProxyType({
+            "template": "engagement-celebration",
+            "reward": "Power user badge"
+        })
+    })
+    
     def __init__(self, courier_client: Courier):
         self.courier = courier_client
+        self._send_sem = asyncio.Semaphore(self.MAX_CONCURRENT_SENDS)
+        
+        # The trycourier client is synchronous; its calls run on this pool
+        # so they never block the event loop
+        self._pool = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        self._profile_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._profile_merges = 0
         
     async def create_user_and_start_onboarding(self, user_data: Dict[str, Any]) -> Dict:
         """Create user profile and trigger onboarding flow"""
@@ -43,42 +219,55 @@ class PythonOnboardingSystem:
             company=user_data.get('company', ''),
             plan=OnboardingPlan(user_data.get('plan', 'trial')),
             company_size=user_data.get('company_size', 1),
-            created_at=datetime.now()
+            created_at=datetime.now(timezone.utc)
         )
         
         # Create/update user profile in Courier
-        profile_response = self.courier.profiles.merge(
+        profile = {
+            "email": user.email,
+            "name": user.name,
+            "company": user.company,
+            "plan": user.plan.value,
+            "company_size": user.company_size,
+            "signup_date": user.created_at.isoformat(),
+            "signup_epoch": int(user.created_at.timestamp()),
+            "timezone": user_data.get('timezone', 'UTC'),
+            "locale": user_data.get('locale', 'en'),
+        }
+        profile_response = await self._acall(
+            self.courier.profiles.merge,
             recipient_id=user.id,
-            profile={
-                "email": user.email,
-                "name": user.name,
-                "company": user.company,
-                "plan": user.plan.value,
-                "company_size": user.company_size,
-                "signup_date": user.created_at.isoformat(),
-                "timezone": user_data.get('timezone', 'UTC'),
-                "locale": user_data.get('locale', 'en'),
-            }
+            profile=profile
         )
+        self._cache_profile(user.id, profile)
         
-        # Trigger appropriate onboarding flow
+        # Trigger appropriate onboarding flow, send the welcome email
+        # immediately and schedule onboarding tasks. None of these depend on
+        # each other, so run them concurrently
         automation_id = self._get_automation_for_plan(user.plan)
         
-        automation_response = self.courier.automations.invoke(
-            automation_id=automation_id,
-            recipient=user.id,
-            data={
-                "user_name": user.name,
-                "company_name": user.company,
-                "plan_features": self._get_plan_features(user.plan)
-            }
+        results = await asyncio.gather(
+            self._acall(
+                self.courier.automations.invoke,
+                automation_id=automation_id,
+                recipient=user.id,
+                data={
+                    "user_name": user.name,
+                    "company_name": user.company,
+                    "plan_features": self._get_plan_features(user.plan)
+                }
+            ),
+            self.send_welcome_email(user),
+            self.create_onboarding_tasks(user, now=user.created_at),
+            return_exceptions=True
         )
         
-        # Send welcome email immediately
-        self.send_welcome_email(user)
-        
-        # Schedule onboarding tasks
-        self.create_onboarding_tasks(user)
+        # Let every step finish before reporting a failure, so nothing is
+        # left running unobserved behind the caller's back
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        automation_response = results[0]
         
         return {
             "user_id": user.id,
@@ -87,333 +276,408 @@ class PythonOnboardingSystem:
             "status": "onboarding_initiated"
         }
     
-    def send_welcome_email(self, user: User) -> Dict:
+    async def send_welcome_email(self, user: User) -> Dict:
         """Send personalized welcome email"""
         
         template_data = {
+            **_WELCOME_PLAN_DATA[user.plan],
             "user_name": user.name,
             "company_name": user.company,
-            "getting_started_link": f"https://app.example.com/onboarding/{user.id}",
-            "support_email": self._get_support_email(user.plan),
-            "onboarding_checklist": self._get_onboarding_checklist(user.plan)
+            "getting_started_link": f"https://app.example.com/onboarding/{user.id}"
         }
         
-        response = self.courier.send(
-            message={
-                "to": {
-                    "user_id": user.id
-                },
-                "template": "welcome-email",
-                "data": template_data,
-                "channels": {
-                    "email": {
-                        "override": {
-                            "subject": f"Welcome to TeamSync, {user.name}! 🎉"
-                        }
+        response = await self._send({
+            "to": {
+                "user_id": user.id
+            },
+            "template": "welcome-email",
+            "data": template_data,
+            "channels": {
+                "email": {
+                    "override": {
+                        "subject": f"Welcome to TeamSync, {user.name}! 🎉"
                     }
                 }
             }
-        )
+        })
         
         return response
     
-    def create_onboarding_tasks(self, user: User) -> List[Dict]:
+    async def create_onboarding_tasks(self, user: User, now: Optional[datetime] = None) -> List[Dict]:
         """Create onboarding tasks in Courier Inbox"""
         
-        base_tasks = [
-            {
-                "id": "complete-profile",
-                "title": "Complete your profile",
-                "priority": 1,
-                "due_days": 1
-            },
-            {
-                "id": "invite-team",
-                "title": "Invite your team members",
-                "priority": 2,
-                "due_days": 3
-            },
-            {
-                "id": "create-project",
-                "title": "Create your first project",
-                "priority": 3,
-                "due_days": 7
-            }
-        ]
+        tasks = list(self._BASE_TASKS)
         
         # Add plan-specific tasks
-        if user.plan == OnboardingPlan.ENTERPRISE:
-            base_tasks.extend([
-                {
-                    "id": "schedule-onboarding-call",
-                    "title": "Schedule onboarding call with success team",
-                    "priority": 0,
-                    "due_days": 1
+        if user.plan is OnboardingPlan.ENTERPRISE:
+            tasks.extend(self._ENTERPRISE_TASKS)
+        
+        # Tasks are independent, so send them concurrently instead of
+        # paying one round-trip per task
+        now = now or datetime.now(timezone.utc)
+        sends = []
+        for task in tasks:
+            due_date = now + timedelta(days=task['due_days'])
+            
+            sends.append(self._send({
+                "to": {"user_id": user.id},
+                "template": "onboarding-task",
+                "channels": ["inbox"],
+                "data": {
+                    "task_id": task['id'],
+                    "task_title": task['title'],
+                    "due_date": due_date.isoformat(),
+                    "action_url": f"/tasks/{task['id']}"
                 },
-                {
-                    "id": "setup-sso",
-                    "title": "Configure Single Sign-On",
-                    "priority": 4,
-                    "due_days": 14
+                "metadata": {
+                    "tags": ["onboarding", f"priority-{task['priority']}"]
                 }
-            ])
+            }))
         
-        tasks_created = []
-        for task in base_tasks:
-            due_date = datetime.now() + timedelta(days=task['due_days'])
-            
-            response = self.courier.send(
-                message={
-                    "to": {"user_id": user.id},
-                    "template": "onboarding-task",
-                    "channels": ["inbox"],
-                    "data": {
-                        "task_id": task['id'],
-                        "task_title": task['title'],
-                        "due_date": due_date.isoformat(),
-                        "action_url": f"/tasks/{task['id']}"
-                    },
-                    "metadata": {
-                        "tags": ["onboarding", f"priority-{task['priority']}"]
-                    }
-                }
-            )
-            tasks_created.append(response)
+        tasks_created = await asyncio.gather(*sends, return_exceptions=True)
+        
+        # Sends report failures in place so the others still go out;
+        # surface the first one like a sequential send would have
+        for result in tasks_created:
+            if isinstance(result, BaseException):
+                raise result
         
-        return tasks_created
+        return list(tasks_created)
     
     async def track_user_progress(self, user_id: str) -> Dict:
         """Track and analyze user's onboarding progress"""
         
-        # Get user profile
-        profile = self.courier.profiles.get(recipient_id=user_id)
+        # Read the clock once for every date calculation below
+        now = datetime.now(timezone.utc)
         
-        # Get message logs
-        logs = self.courier.logs.list(
-            recipient=user_id,
-            limit=50
-        )
+        # Get user profile
+        profile = await self._get_profile_cached(user_id)
+        plan = self._get_plan(profile)
+        
+        # Analyze logs page by page as they arrive, counting into locals
+        # rather than updating the metrics dict for every entry
+        emails_sent = emails_opened = tasks_completed = 0
+        last_activity = None
+        async with aclosing(self._iter_logs(user_id)) as pages:
+            async for logs in pages:
+                timestamps = []
+                for log in logs:
+                    channel = log['channel']
+                    if channel == 'email':
+                        emails_sent += 1
+                        if log.get('opened_at'):
+                            emails_opened += 1
+                    elif channel == 'inbox' and log.get('read_at'):
+                        tasks_completed += 1
+                    
+                    timestamp = log.get('timestamp')
+                    if timestamp:
+                        timestamps.append(timestamp)
+                
+                if timestamps:
+                    page_latest = max(timestamps)
+                    if not last_activity or page_latest > last_activity:
+                        last_activity = page_latest
+        
+        # Only the latest timestamp is needed as a number, so parse it once
+        # here rather than every log entry
+        last_activity_epoch = _to_epoch(last_activity) if last_activity else None
         
         metrics = {
             "user_id": user_id,
-            "days_since_signup": self._calculate_days_since(profile.get('signup_date')),
-            "emails_sent": 0,
-            "emails_opened": 0,
-            "tasks_completed": 0,
-            "last_activity": None,
+            "days_since_signup": self._get_days_since_signup(profile, now),
+            "emails_sent": emails_sent,
+            "emails_opened": emails_opened,
+            "tasks_completed": tasks_completed,
+            "last_activity": last_activity,
             "engagement_score": 0
         }
         
-        # Analyze logs
-        for log in logs:
-            if log['channel'] == 'email':
-                metrics['emails_sent'] += 1
-                if log.get('opened_at'):
-                    metrics['emails_opened'] += 1
-            
-            if log['channel'] == 'inbox' and log.get('read_at'):
-                metrics['tasks_completed'] += 1
-            
-            if log.get('timestamp'):
-                if not metrics['last_activity'] or log['timestamp'] > metrics['last_activity']:
-                    metrics['last_activity'] = log['timestamp']
-        
         # Calculate engagement score
-        metrics['engagement_score'] = self._calculate_engagement_score(metrics)
+        metrics['engagement_score'] = self._calculate_engagement_score(
+            metrics, now, last_activity_epoch
+        )
         
         # Check if intervention needed
         if self._needs_intervention(metrics):
-            await self._trigger_intervention(user_id, metrics)
+            await self._trigger_intervention(user_id, metrics, profile, plan)
         
         return metrics
     
-    async def _trigger_intervention(self, user_id: str, metrics: Dict):
+    async def _trigger_intervention(self, user_id: str, metrics: Dict, profile: Dict,
+                                    plan: Optional[OnboardingPlan]):
         """Trigger intervention for at-risk users"""
         
-        profile = self.courier.profiles.get(recipient_id=user_id)
-        
-        if profile.get('plan') == 'enterprise':
+        if plan is OnboardingPlan.ENTERPRISE:
             # Escalate to Slack for enterprise customers
-            self.courier.send(
-                message={
-                    "to": {
-                        "slack": {
-                            "channel": "#customer-success",
-                            "access_token": "YOUR_SLACK_TOKEN"
-                        }
-                    },
-                    "template": "enterprise-intervention-alert",
-                    "data": {
-                        "user_id": user_id,
-                        "company": profile.get('company'),
-                        "metrics": metrics,
-                        "risk_level": "high" if metrics['engagement_score'] < 30 else "medium"
+            await self._send({
+                "to": {
+                    "slack": {
+                        "channel": "#customer-success",
+                        "access_token": "YOUR_SLACK_TOKEN"
                     }
+                },
+                "template": "enterprise-intervention-alert",
+                "data": {
+                    "user_id": user_id,
+                    "company": profile.get('company'),
+                    "metrics": metrics,
+                    "risk_level": "high" if metrics['engagement_score'] < 30 else "medium"
                 }
-            )
+            })
         else:
             # Send re-engagement email
-            self.courier.send(
-                message={
-                    "to": {"user_id": user_id},
-                    "template": "re-engagement-email",
-                    "data": {
-                        "days_inactive": metrics['days_since_signup'],
-                        "uncompleted_tasks": 5 - metrics['tasks_completed']
-                    }
+            await self._send({
+                "to": {"user_id": user_id},
+                "template": "re-engagement-email",
+                "data": {
+                    "days_inactive": metrics['days_since_signup'],
+                    "uncompleted_tasks": 5 - metrics['tasks_completed']
                 }
-            )
+            })
     
-    def send_milestone_celebration(self, user_id: str, milestone: str):
+    async def send_milestone_celebration(self, user_id: str, milestone: str):
         """Send celebration message for completed milestones"""
         
-        celebrations = {
-            "first_project": {
-                "template": "first-project-celebration",
-                "reward": "1 month free upgrade"
-            },
-            "team_invited": {
-                "template": "team-growth-celebration",
-                "reward": "Collaboration guide"
-            },
-            "week_active": {
-                "template": "engagement-celebration",
-                "reward": "Power user badge"
-            }
-        }
+        celebration = self._CELEBRATIONS.get(milestone)
         
-        if milestone in celebrations:
-            self.courier.send(
-                message={
-                    "to": {"user_id": user_id},
-                    "template": celebrations[milestone]['template'],
-                    "data": {
-                        "milestone": milestone,
-                        "reward": celebrations[milestone]['reward']
-                    },
-                    "channels": ["email", "inbox", "push"]
-                }
-            )
+        if celebration:
+            await self._send({
+                "to": {"user_id": user_id},
+                "template": celebration['template'],
+                "data": {
+                    "milestone": milestone,
+                    "reward": celebration['reward']
+                },
+                "channels": ["email", "inbox", "push"]
+            })
     
-    def create_digest_for_team_leads(self):
+    async def create_digest_for_team_leads(self):
         """Create weekly digest for team leads about their team's onboarding"""
         
         # This would run as a scheduled job
         team_leads = self._get_team_leads()
         
-        for lead in team_leads:
-            team_metrics = self._get_team_onboarding_metrics(lead['team_id'])
-            
-            self.courier.send(
-                message={
-                    "to": {"user_id": lead['user_id']},
-                    "template": "team-onboarding-digest",
-                    "data": {
-                        "team_name": lead['team_name'],
-                        "new_members": team_metrics['new_members'],
-                        "activation_rate": team_metrics['activation_rate'],
-                        "average_progress": team_metrics['average_progress'],
-                        "members_needing_help": team_metrics['at_risk_members']
-                    }
+        # Leads are independent, so fetch every team's metrics concurrently
+        all_team_metrics = await asyncio.gather(*(
+            self._get_team_onboarding_metrics(lead['team_id'])
+            for lead in team_leads
+        ))
+        
+        results = await asyncio.gather(*(
+            self._send({
+                "to": {"user_id": lead['user_id']},
+                "template": "team-onboarding-digest",
+                "data": {
+                    "team_name": lead['team_name'],
+                    "new_members": team_metrics['new_members'],
+                    "activation_rate": team_metrics['activation_rate'],
+                    "average_progress": team_metrics['average_progress'],
+                    "members_needing_help": team_metrics['at_risk_members']
                 }
-            )
+            })
+            for lead, team_metrics in zip(team_leads, all_team_metrics)
+        ), return_exceptions=True)
+        
+        # Sends report failures in place so every lead still gets a digest;
+        # surface the first one so the scheduled job doesn't fail silently
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        
+        return results
+    
+    async def aclose(self):
+        """Release the worker threads used for Courier calls"""
+        # Wait for in-flight calls off the event loop
+        await asyncio.to_thread(self._pool.shutdown, wait=True)
     
     # Helper methods
+    async def _acall(self, fn: Callable[..., Any], **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(fn, **kwargs))
+    
+    async def _iter_logs(self, user_id: str, page_size: int = 100) -> AsyncIterator[List[Dict]]:
+        # Follow Courier's paging cursor so heavy users aren't truncated.
+        # The next page is requested before the current one is yielded, so
+        # the caller counts one page while the next is still in flight
+        def fetch(cursor: Optional[str]):
+            kwargs = {"recipient": user_id, "limit": page_size}
+            if cursor:
+                kwargs["cursor"] = cursor
+            return asyncio.create_task(self._acall(self.courier.logs.list, **kwargs))
+        
+        pending = fetch(None)
+        try:
+            while pending:
+                page = await pending
+                pending = None
+                
+                # A plain list of logs is a single, unpaginated page
+                if not isinstance(page, dict):
+                    yield list(page)
+                    continue
+                
+                paging = page.get('paging') or {}
+                cursor = paging.get('cursor')
+                if paging.get('more') and cursor:
+                    pending = fetch(cursor)
+                yield page.get('results', [])
+        finally:
+            if pending:
+                pending.cancel()
+    
+    async def _send(self, message: CourierMessage) -> Dict:
+        # Every send goes through one semaphore so concurrent fan-outs
+        # (tasks, digests, interventions) can't overrun Courier's rate limits
+        async with self._send_sem:
+            return await self._acall(self.courier.send, message=message)
+    
+    def _get_plan(self, profile: Dict) -> Optional[OnboardingPlan]:
+        try:
+            return OnboardingPlan(profile.get('plan'))
+        except ValueError:
+            return None
+    
     def _get_automation_for_plan(self, plan: OnboardingPlan) -> str:
-        automations = {
-            OnboardingPlan.TRIAL: "trial-onboarding-flow",
-            OnboardingPlan.STARTUP: "startup-onboarding-flow",
-            OnboardingPlan.ENTERPRISE: "enterprise-onboarding-flow",
-            OnboardingPlan.EDUCATION: "education-onboarding-flow"
-        }
-        return automations.get(plan, "default-onboarding-flow")
-    
-    def _get_plan_features(self, plan: OnboardingPlan) -> List[str]:
-        features = {
-            OnboardingPlan.TRIAL: ["basic_features", "email_support"],
-            OnboardingPlan.STARTUP: ["all_features", "priority_support", "integrations"],
-            OnboardingPlan.ENTERPRISE: ["all_features", "dedicated_support", "sso", "api_access"],
-            OnboardingPlan.EDUCATION: ["education_features", "bulk_licensing", "lms_integration"]
-        }
-        return features.get(plan, [])
-    
-    def _get_support_email(self, plan: OnboardingPlan) -> str:
-        if plan == OnboardingPlan.ENTERPRISE:
-            return "enterprise-support@example.com"
-        return "support@example.com"
-    
-    def _get_onboarding_checklist(self, plan: OnboardingPlan) -> List[str]:
-        base_checklist = [
-            "Complete your profile",
-            "Invite team members",
-            "Create first project",
-            "Connect integrations"
-        ]
-        
-        if plan == OnboardingPlan.ENTERPRISE:
-            base_checklist.extend([
-                "Schedule onboarding call",
-                "Configure SSO",
-                "Review security settings"
-            ])
-        
-        return base_checklist
-    
-    def _calculate_days_since(self, date_str: Optional[str]) -> int:
+        return _AUTOMATIONS.get(plan, "default-onboarding-flow")
+    
+    def _get_plan_features(self, plan: OnboardingPlan) -> Tuple[str, ...]:
+        return _PLAN_FEATURES.get(plan, ())
+    
+    async def _get_profile_cached(self, user_id: str) -> Dict:
+        cached = self._profile_cache.pop(user_id, None)
+        if cached and time.monotonic() - cached[0] < self.PROFILE_CACHE_TTL:
+            # Re-insert so the most recently used profiles are evicted last
+            self._profile_cache[user_id] = cached
+            return cached[1]
+        
+        # A merge that lands while this read is in flight may make the
+        # response stale, so only cache it if no merge happened meanwhile
+        merges = self._profile_merges
+        profile = await self._acall(self.courier.profiles.get, recipient_id=user_id)
+        if merges == self._profile_merges:
+            self._store_profile(user_id, profile)
+        return profile
+    
+    def _cache_profile(self, user_id: str, profile: Dict):
+        # Called after profiles.merge. Merges only send changed fields, so
+        # they can be folded into a profile from a full fetch; without one,
+        # drop the entry so the next read fetches the whole profile
+        self._profile_merges += 1
+        cached = self._profile_cache.pop(user_id, None)
+        if cached and time.monotonic() - cached[0] < self.PROFILE_CACHE_TTL:
+            self._store_profile(user_id, {**cached[1], **profile})
+    
+    def _store_profile(self, user_id: str, profile: Dict):
+        self._profile_cache[user_id] = (time.monotonic(), profile)
+        if len(self._profile_cache) > self.PROFILE_CACHE_SIZE:
+            del self._profile_cache[next(iter(self._profile_cache))]
+    
+    def _calculate_days_since(self, date_str: Optional[str], now: Optional[datetime] = None) -> int:
         if not date_str:
             return 0
         
-        signup_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        return (datetime.now() - signup_date).days
+        now_epoch = int(now.timestamp()) if now else None
+        return self._calculate_days_since_epoch(_to_epoch(date_str), now_epoch)
     
-    def _calculate_engagement_score(self, metrics: Dict) -> int:
-        score = 0
-        
-        # Email engagement (max 40 points)
-        if metrics['emails_sent'] > 0:
-            open_rate = metrics['emails_opened'] / metrics['emails_sent']
-            score += min(open_rate * 40, 40)
-        
-        # Task completion (max 40 points)
-        score += min(metrics['tasks_completed'] * 10, 40)
-        
-        # Recency (max 20 points)
-        if metrics['last_activity']:
-            days_since_activity = self._calculate_days_since(metrics['last_activity'])
-            if days_since_activity == 0:
-                score += 20
-            elif days_since_activity <= 3:
-                score += 10
-            elif days_since_activity <= 7:
-                score += 5
-        
-        return min(score, 100)
+    def _get_days_since_signup(self, profile: Dict, now: datetime) -> int:
+        # Profiles written by this system carry epoch seconds; older ones
+        # only have the ISO signup_date
+        signup_epoch = profile.get('signup_epoch')
+        if signup_epoch is not None:
+            return self._calculate_days_since_epoch(signup_epoch, int(now.timestamp()))
+        return self._calculate_days_since(profile.get('signup_date'), now)
+    
+    def _calculate_days_since_epoch(self, ts: int, now_epoch: Optional[int] = None) -> int:
+        if now_epoch is None:
+            now_epoch = int(time.time())
+        return (now_epoch - ts) // 86400
+    
+    def _calculate_engagement_score(self, metrics: Dict, now: Optional[datetime] = None,
+                                    last_activity_epoch: Optional[int] = None) -> int:
+        days_since_activity = None
+        if last_activity_epoch is not None:
+            now_epoch = int(now.timestamp()) if now else None
+            days_since_activity = self._calculate_days_since_epoch(last_activity_epoch, now_epoch)
+        elif metrics['last_activity']:
+            days_since_activity = self._calculate_days_since(metrics['last_activity'], now)
+        
+        return _score(
+            metrics['emails_sent'],
+            metrics['emails_opened'],
+            metrics['tasks_completed'],
+            days_since_activity
+        )
     
     def _needs_intervention(self, metrics: Dict) -> bool:
-        return (
-            metrics['engagement_score'] < 30 or
-            metrics['days_since_signup'] > 7 and metrics['tasks_completed'] < 2 or
-            metrics['emails_opened'] == 0 and metrics['emails_sent'] > 3
+        return _is_at_risk(
+            metrics['engagement_score'],
+            metrics['days_since_signup'],
+            metrics['tasks_completed'],
+            metrics['emails_opened'],
+            metrics['emails_sent']
         )
     
     def _get_team_leads(self) -> List[Dict]:
         # Placeholder - would query your database
         return []
     
-    def _get_team_onboarding_metrics(self, team_id: str) -> Dict:
-        # Placeholder - would calculate team metrics
+    def _get_team_member_columns(self, team_id: str) -> Dict[str, List]:
+        # Placeholder - would query your database for the members who joined
+        # the team this digest period, so row count is "new_members". One
+        # list per metric, aligned by index, so a whole team is scored in a
+        # single pass. The digest derives activation_rate as a 0-1 fraction
+        # of members scoring ACTIVATION_SCORE or more, and average_progress
+        # as the mean 0-100 engagement score
         return {
-            "new_members": 0,
-            "activation_rate": 0,
-            "average_progress": 0,
-            "at_risk_members": []
+            "user_ids": [],
+            "emails_sent": [],
+            "emails_opened": [],
+            "tasks_completed": [],
+            "days_since_activity": [],
+            "days_since_signup": []
+        }
+    
+    async def _get_team_onboarding_metrics(self, team_id: str) -> Dict:
+        columns = self._get_team_member_columns(team_id)
+        
+        scores = list(map(
+            _score,
+            columns['emails_sent'],
+            columns['emails_opened'],
+            columns['tasks_completed'],
+            columns['days_since_activity']
+        ))
+        member_count = len(scores)
+        if not member_count:
+            return {
+                "new_members": 0,
+                "activation_rate": 0,
+                "average_progress": 0,
+                "at_risk_members": []
+            }
+        
+        activated = sum(score >= self.ACTIVATION_SCORE for score in scores)
+        at_risk = map(
+            _is_at_risk,
+            scores,
+            columns['days_since_signup'],
+            columns['tasks_completed'],
+            columns['emails_opened'],
+            columns['emails_sent']
+        )
+        return {
+            "new_members": member_count,
+            "activation_rate": activated / member_count,
+            "average_progress": sum(scores) / member_count,
+            "at_risk_members": list(compress(columns['user_ids'], at_risk))
         }
 
 
 # Example usage
 async def main():
-    courier = Courier(auth_token="YOUR_AUTH_TOKEN")
-    onboarding = PythonOnboardingSystem(courier)
+    onboarding = PythonOnboardingSystem(client)
     
     # Create new user and start onboarding
     new_user = await onboarding.create_user_and_start_onboarding({
@@ -434,7 +698,9 @@ async def main():
     print(f"User engagement score: {progress['engagement_score']}")
     
     # Send milestone celebration
-    onboarding.send_milestone_celebration("user-123", "first_project")
+    await onboarding.send_milestone_celebration("user-123", "first_project")
+    
+    await onboarding.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file